@@ -1,6 +1,5 @@
 import streamlit as st
-import matplotlib.pyplot as plt
-from utils import calculate_metrics, generate_recommendations
+from utils import calculate_metrics_scalar, generate_recommendations
 
 st.title("🔢 Single Audit Calculator")
 
@@ -23,25 +22,28 @@ with st.form("input_form"):
     submitted = st.form_submit_button("Calculate")
 
 if submitted:
-    results = calculate_metrics(coal_flow, gcv, steam_flow, h_steam, h_feed,
-                                power_output, flue_temp, ambient_temp)
+    results = calculate_metrics_scalar(coal_flow, gcv, steam_flow, h_steam, h_feed,
+                                       power_output, flue_temp, ambient_temp)
 
     st.success("✅ Calculation Complete!")
 
     st.subheader("📊 Key Metrics")
-    st.write(f"**Boiler Efficiency:** {results['boiler_efficiency']:.2f}%")
-    st.write(f"**Heat Rate:** {results['heat_rate']:.2f} kcal/kWh")
-    st.write(f"**SFC:** {results['sfc']:.2f} kg/kWh")
-    st.write(f"**Flue Gas Loss:** {results['flue_gas_loss']:.2f}%")
-    st.write(f"**CO₂ Emissions:** {results['co2_emissions']:.2f} kg/hr")
+    st.write(f"**Boiler Efficiency:** {results.boiler_efficiency:.2f}%")
+    st.write(f"**Heat Rate:** {results.plant_heat_rate:.2f} kcal/kWh")
+    st.write(f"**SFC:** {results.sfc:.2f} kg/kWh")
+    st.write(f"**Flue Gas Loss:** {results.flue_gas_loss:.2f}%")
+    st.write(f"**CO₂ Emissions:** {results.co2:.2f} kg/hr")
 
     st.subheader("📌 Recommendations")
-    st.write(generate_recommendations(results))
+    for rec in generate_recommendations(results.as_dict()):
+        st.markdown(rec)
 
     st.subheader("📉 Visual Overview")
+    # Imported here so loading the page doesn't pay for matplotlib until there is something to plot
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     labels = ['Efficiency (%)', 'Heat Rate', 'SFC', 'Flue Loss']
-    values = [results['boiler_efficiency'], results['heat_rate'], results['sfc'], results['flue_gas_loss']]
+    values = [results.boiler_efficiency, results.plant_heat_rate, results.sfc, results.flue_gas_loss]
     ax.bar(labels, values, color=['green', 'orange', 'red', 'blue'])
     ax.set_ylabel("Values")
     st.pyplot(fig)
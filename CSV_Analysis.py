@@ -1,52 +1,78 @@
 import streamlit as st
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from utils import calculate_metrics
+import hashlib
+from utils import INPUT_COLUMNS, calculate_metrics_vec, read_plant_csv, to_csv_bytes
+
+
+# Streamlit reruns this script on every interaction; cache the heavy steps on
+# a fingerprint of the uploaded file so they only run again for a new file.
+@st.cache_data(show_spinner=False)
+def load_csv(file_key, _file_bytes, numeric_columns):
+    return read_plant_csv(_file_bytes, numeric_columns)
+
+
+@st.cache_data(show_spinner=False)
+def compute_audit(file_key, _df):
+    # file_key is the cache key; the leading underscore stops Streamlit hashing _df.
+    # assign adds all metric columns in one step without a deep copy of the input columns
+    return _df.assign(**calculate_metrics_vec(_df))
+
+
+@st.cache_data(show_spinner=False)
+def export_csv(file_key, _df):
+    # CSV bytes for the download button, cached like compute_audit
+    return to_csv_bytes(_df)
+
+
+@st.cache_data(show_spinner=False)
+def compute_corr(file_key, _df):
+    return _df.corr(numeric_only=True)
+
 
 st.title("📂 CSV Audit - Batch Mode")
 
 uploaded_file = st.file_uploader("Upload CSV File", type=["csv"])
 
-required_columns = [
-    "Coal Flow", "GCV", "Steam Flow", "Steam Enthalpy", 
-    "Feedwater Enthalpy", "Power Output", "Flue Temp", "Ambient Temp"
-]
+required_columns = list(INPUT_COLUMNS)
+REQUIRED = frozenset(required_columns)
 
 if uploaded_file:
     try:
-        df = pd.read_csv(uploaded_file)
+        file_bytes = uploaded_file.getvalue()
+        # Short fingerprint of the upload, hashed once per run; used as the cache key of every
+        # cached step instead of having Streamlit hash the whole file again for each call
+        file_fp = hashlib.blake2b(file_bytes, digest_size=8).hexdigest()
+        df = load_csv(file_fp, file_bytes, required_columns)
 
         st.subheader("📋 Uploaded Data")
         st.dataframe(df.head())
 
         # Validate required columns
-        if not all(col in df.columns for col in required_columns):
+        if REQUIRED - set(df.columns):
             st.error(f"❌ Uploaded CSV must contain these columns:\n{', '.join(required_columns)}")
         else:
-            with st.spinner("🔄 Processing data..."):
-                results = []
-                for _, row in df.iterrows():
-                    r = calculate_metrics(
-                        row["Coal Flow"], row["GCV"], row["Steam Flow"],
-                        row["Steam Enthalpy"], row["Feedwater Enthalpy"],
-                        row["Power Output"], row["Flue Temp"], row["Ambient Temp"]
-                    )
-                    results.append(r)
-
-                result_df = pd.DataFrame(results)
-                final_df = pd.concat([df, result_df], axis=1)
-
-            st.subheader("📊 Audit Results")
-            st.dataframe(final_df)
-
-            st.download_button("📥 Download Result CSV", data=final_df.to_csv(index=False),
-                               file_name="audit_results.csv", mime="text/csv")
-
-            st.subheader("📈 Correlation Heatmap")
-            fig, ax = plt.subplots(figsize=(10, 8))
-            sns.heatmap(final_df.corr(numeric_only=True), ax=ax, cmap="coolwarm", annot=True)
-            st.pyplot(fig)
+            # Drop rows where critical input columns are missing or were not numeric
+            # so they never reach the metric kernel
+            df.dropna(subset=required_columns, inplace=True)
+
+            if df.empty:
+                st.warning("No valid data rows remaining after cleaning. Please check your CSV for missing or non-numeric values in critical input columns.")
+            else:
+                with st.spinner("🔄 Processing data..."):
+                    final_df = compute_audit(file_fp, df)
+
+                st.subheader("📊 Audit Results")
+                st.dataframe(final_df)
+
+                st.download_button("📥 Download Result CSV", data=export_csv(file_fp, final_df),
+                                   file_name="audit_results.csv", mime="text/csv")
+
+                st.subheader("📈 Correlation Heatmap")
+                # Plotting libraries are only imported once there is a heatmap to draw
+                import seaborn as sns
+                import matplotlib.pyplot as plt
+                fig, ax = plt.subplots(figsize=(10, 8))
+                sns.heatmap(compute_corr(file_fp, final_df), ax=ax, cmap="coolwarm", annot=True)
+                st.pyplot(fig)
 
     except Exception as e:
         st.error(f"❌ Error reading file: {e}")
@@ -1,145 +1,108 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+import numpy as np
+from matplotlib.figure import Figure
 import seaborn as sns
 import io # Import io for capturing info() output
-
-# Define the calculate_metrics function
-# This function calculates various power plant performance and emission metrics
-def calculate_metrics(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp):
+import hashlib
+from utils import INPUT_COLUMNS, METRIC_COLUMNS, calculate_metrics_vec, generate_recommendations, read_plant_csv
+
+# Cached steps of the dashboard. Streamlit reruns the whole script on every widget
+# interaction, so these are keyed on a fingerprint of the uploaded file and only
+# recompute when a different file is uploaded.
+@st.cache_data(show_spinner=False)
+def load_csv(file_key, _file_bytes, numeric_columns):
+    """Parses the uploaded CSV; numeric_columns are read as float32, invalid values become NaN."""
+    # float32 halves the memory of the cached frame; the metric kernel still computes in float64
+    return read_plant_csv(_file_bytes, numeric_columns, dtype="float32")
+
+@st.cache_data(show_spinner=False)
+def compute_metrics(file_key, _df):
     """
-    Calculates key performance and emission metrics for a power plant.
+    Appends the calculated metrics to the cleaned input data.
 
     Args:
-        coal_flow (float): Coal flow rate (e.g., kg/hr).
-        gcv (float): Gross Calorific Value of coal (e.g., kcal/kg).
-        steam_flow (float): Steam flow rate (e.g., kg/hr).
-        steam_h (float): Enthalpy of steam (e.g., kcal/kg).
-        feed_h (float): Enthalpy of feedwater (e.g., kcal/kg).
-        power_output (float): Electrical power output (e.g., kWh).
-        flue_temp (float): Flue gas temperature (e.g., °C).
-        amb_temp (float): Ambient air temperature (e.g., °C).
+        file_key (str): Fingerprint of the uploaded file, used only as the cache key.
+        _df (pd.DataFrame): Cleaned input data (the leading underscore keeps Streamlit from hashing it).
 
     Returns:
-        dict: A dictionary containing the calculated metrics.
+        pd.DataFrame: The input data followed by the metric columns.
     """
-    # Calculate heat input from coal
-    energy_input = coal_flow * gcv
-
-    # Calculate useful energy output in steam
-    steam_energy = steam_flow * (steam_h - feed_h)
-
-    # Calculate Boiler Efficiency (percentage)
-    # Avoid division by zero by checking if energy_input is not zero
-    efficiency = (steam_energy / energy_input) * 100 if energy_input != 0 else 0
-
-    # Calculate Plant Heat Rate (kcal/kWh)
-    # Avoid division by zero by checking if power_output is not zero
-    plant_heat_rate = (energy_input / power_output) if power_output != 0 else 0
-
-    # Calculate Specific Fuel Consumption (kg/kWh)
-    # Avoid division by zero by checking if power_output is not zero
-    specific_fuel_consumption = (coal_flow / power_output) if power_output != 0 else 0
-
-    # Calculate CO2 emissions (kg/hr) based on coal flow
-    # Assuming 2.29 kg CO2 per kg of bituminous coal (approximate factor)
-    co2_emissions = coal_flow * 2.29
-
-    # Calculate Flue Gas Loss (simplified placeholder formula)
-    # A more accurate calculation would involve actual flue gas mass and specific heat capacity (Cp)
-    flue_loss = (flue_temp - amb_temp) * 0.25 # This is a placeholder; needs refinement for real-world accuracy
-
-    return {
-        "Boiler Efficiency": efficiency,
-        "Plant Heat Rate (kcal/kWh)": plant_heat_rate,
-        "Specific Fuel Consumption (kg/kWh)": specific_fuel_consumption,
-        "Flue Gas Loss": flue_loss,
-        "CO2 Emissions (kg/hr)": co2_emissions
-    }
-
-# Define the generate_recommendations function
-def generate_recommendations(metrics):
+    # calculate_metrics_vec works on whole columns, so there is no per-row Python call
+    # and no Series of dicts to expand back into a DataFrame
+    return _df.assign(**calculate_metrics_vec(_df))
+
+@st.cache_resource(max_entries=32)
+def make_plots_figure(file_key, _df, panels):
     """
-    Generates recommendations based on power plant performance metrics.
+    Draws the performance plots on one shared figure, kept across reruns.
+
+    The figure is created with Figure() rather than plt.subplots() so pyplot does not keep
+    its own reference to every cached figure.
 
     Args:
-        metrics (dict): A dictionary containing average calculated metrics.
+        file_key (str): Fingerprint of the uploaded file, used only as the cache key.
+        _df (pd.DataFrame): Input data with the calculated metrics.
+        panels (tuple): (kind, x, y, title, x label, y label) for each panel, kind being
+            "scatter" or "hist".
 
     Returns:
-        list: A list of recommendation strings.
+        Figure: One row of panels.
     """
-    rec = []
-
-    # Recommendation for Boiler Efficiency
-    be = metrics.get('Boiler Efficiency', 0)
-    if be > 85:
-        rec.append("✅ **Boiler Efficiency (Avg: {:.2f}%)**: Excellent. Maintain current operation and schedule routine maintenance.".format(be))
-    elif 70 <= be <= 85:
-        rec.append("⚠️ **Boiler Efficiency (Avg: {:.2f}%)**: Good, but room for improvement. Optimize excess air supply, clean heat transfer surfaces (e.g., soot blowing).".format(be))
-    else:
-        rec.append("❌ **Boiler Efficiency (Avg: {:.2f}%)**: Inefficient. Check for incomplete combustion, poor coal quality, leaks, and fouling in boiler tubes. Consider retrofitting economizers or better insulation.".format(be))
-
-    # Recommendation for Plant Heat Rate
-    hr = metrics.get('Plant Heat Rate (kcal/kWh)', 0)
-    if hr < 2500 and hr != 0: # Ensure not zero, which could happen if power_output was zero
-        rec.append("✅ **Plant Heat Rate (Avg: {:.2f} kcal/kWh)**: Efficient. Maintain load management and keep equipment in tuned condition.".format(hr))
-    elif 2500 <= hr <= 3000:
-        rec.append("⚠️ **Plant Heat Rate (Avg: {:.2f} kcal/kWh)**: Average. Inspect turbine sealing, condenser vacuum, and reheater losses.".format(hr))
-    else: # This covers > 3000 and the zero case if power_output was zero
-        rec.append("❌ **Plant Heat Rate (Avg: {:.2f} kcal/kWh)**: Inefficient. Audit heat exchangers, check turbine performance, condenser vacuum issues, and unaccounted auxiliary consumption.".format(hr))
-
-    # Recommendation for Specific Fuel Consumption
-    sfc = metrics.get('Specific Fuel Consumption (kg/kWh)', 0)
-    if sfc < 0.6 and sfc != 0: # Ensure not zero
-        rec.append("✅ **Specific Fuel Consumption (Avg: {:.2f} kg/kWh)**: Efficient. Ensure consistent coal quality and maintain feed systems.".format(sfc))
-    elif 0.6 <= sfc <= 0.75:
-        rec.append("⚠️ **Specific Fuel Consumption (Avg: {:.2f} kg/kWh)**: Acceptable. Verify air-fuel ratio, minimize unburnt carbon.".format(sfc))
-    else: # This covers > 0.75 and the zero case
-        rec.append("❌ **Specific Fuel Consumption (Avg: {:.2f} kg/kWh)**: High. Recommend coal quality improvement, combustion tuning, and reducing clinker formation.".format(sfc))
-
-    # Recommendation for Flue Gas Loss
-    fl = metrics.get('Flue Gas Loss', 0)
-    if fl < 5 and fl != 0: # Ensure not zero
-        rec.append("✅ **Flue Gas Loss (Avg: {:.2f}%)**: Optimal flue gas recovery. Keep stack temperature and air ratio monitored.".format(fl))
-    elif 5 <= fl <= 10:
-        rec.append("⚠️ **Flue Gas Loss (Avg: {:.2f}%)**: Moderate loss. Consider preheating combustion air or recovering heat using economizer.".format(fl))
-    else: # This covers > 10 and the zero case
-        rec.append("❌ **Flue Gas Loss (Avg: {:.2f}%)**: High heat loss. Suggest urgent flue gas heat recovery installation, reduce excess air, and check for insulation leaks.".format(fl))
-
-    # Recommendation for CO2 Emissions (optional, based on your previous examples)
-    co2 = metrics.get('CO2 Emissions (kg/hr)', 0)
-    if co2 > 8000: # Example threshold
-        rec.append("⚠️ **CO₂ Emissions (Avg: {:.2f} kg/hr)**: High CO₂ emissions. Explore cleaner fuels or carbon capture technologies.".format(co2))
-    elif co2 > 0: # General message if not extremely high but still present
-        rec.append("✅ **CO₂ Emissions (Avg: {:.2f} kg/hr)**: Monitor CO₂ emissions regularly and explore opportunities for reduction.".format(co2))
-
-    return rec
+    fig = Figure(figsize=(6 * len(panels), 6))
+    axes = fig.subplots(1, len(panels), squeeze=False)
+    for ax, (kind, x, y, title, xlabel, ylabel) in zip(axes[0], panels):
+        if kind == "scatter":
+            sns.scatterplot(data=_df, x=x, y=y, ax=ax)
+        else:
+            # Fixed-bin histogram counted in one NumPy pass; seaborn's KDE overlay
+            # evaluated a Gaussian for every data point
+            values = _df[x].to_numpy(dtype=np.float64)
+            counts, edges = np.histogram(values[np.isfinite(values)], bins=HIST_BINS)
+            ax.bar(edges[:-1], counts, width=np.diff(edges), align="edge")
+        ax.set_title(title)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+    fig.tight_layout()
+    return fig
 
 # Streamlit UI
 st.title("📊 Performance & Emissions Dashboard")
 
 uploaded_file = st.file_uploader("Upload Power Plant Data CSV", type=["csv"])
 
+# Debugging output (DataFrame info and plot checks) is only produced when asked for,
+# since DataFrame.info() scans every column on each rerun
+debug = st.sidebar.checkbox("Debug")
+
+numeric_cols = list(INPUT_COLUMNS)
+REQUIRED = frozenset(numeric_cols)
+
+# Above this many rows the scatter plots are drawn in the browser with st.scatter_chart;
+# rendering every marker through matplotlib on the server gets slow and memory-heavy
+SCATTER_CHART_ROWS = 5000
+
+# Number of bins in the Plant Heat Rate histogram
+HIST_BINS = 50
+
 if uploaded_file:
     # Read the uploaded CSV into a pandas DataFrame
-    df = pd.read_csv(uploaded_file)
+    # The numerical columns are converted while parsing (invalid values become NaN),
+    # which is crucial for calculations and prevents errors from mixed types
+    file_bytes = uploaded_file.getvalue()
+    # Short fingerprint of the upload, hashed once per run; used as the cache key of every
+    # cached step instead of having Streamlit hash the whole file again for each call
+    file_fp = hashlib.blake2b(file_bytes, digest_size=8).hexdigest()
+    df = load_csv(file_fp, file_bytes, numeric_cols)
 
     st.subheader("📄 Preview of Raw Data")
     st.dataframe(df.head())
 
-    # Ensure all numerical columns are indeed numeric
-    # This step is crucial for calculations and prevents errors from mixed types
-    numeric_cols = [
-        'Coal Flow', 'GCV', 'Steam Flow', 'Steam Enthalpy',
-        'Feedwater Enthalpy', 'Power Output', 'Flue Temp', 'Ambient Temp'
-    ]
-    for col in numeric_cols:
-        if col in df.columns:
-            # Convert to numeric, coerce errors will turn invalid parsing into NaN
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        else:
-            st.error(f"Missing expected column in CSV: **{col}**. Please ensure your CSV has all required columns.")
-            st.stop() # Stop execution if a critical column is missing
+    # Report every missing column at once rather than stopping at the first
+    missing = REQUIRED - set(df.columns)
+    if missing:
+        missing_cols = ", ".join(f"**{col}**" for col in numeric_cols if col in missing)
+        st.error(f"Missing expected columns in CSV: {missing_cols}. Please ensure your CSV has all required columns.")
+        st.stop() # Stop execution if a critical column is missing
 
     # Drop rows where any of the critical input columns are NaN after coercion
     df.dropna(subset=numeric_cols, inplace=True)
@@ -148,108 +111,96 @@ if uploaded_file:
         st.warning("No valid data rows remaining after cleaning. Please check your CSV for missing or non-numeric values in critical columns.")
         st.stop()
 
-    # --- Apply the calculate_metrics function to each row of the DataFrame ---
-    calculated_metrics_df = df.apply(
-        lambda row: calculate_metrics(
-            coal_flow=row['Coal Flow'],
-            gcv=row['GCV'],
-            steam_flow=row['Steam Flow'],
-            steam_h=row['Steam Enthalpy'],
-            feed_h=row['Feedwater Enthalpy'],
-            power_output=row['Power Output'],
-            flue_temp=row['Flue Temp'],
-            amb_temp=row['Ambient Temp']
-        ),
-        axis=1
-    ).apply(pd.Series) # Explicitly convert the Series of dictionaries to a DataFrame
-
-    # Concatenate the original DataFrame with the new calculated metrics DataFrame
-    df_with_metrics = pd.concat([df, calculated_metrics_df], axis=1)
+    # --- Calculate the metrics for every row at once ---
+    df_with_metrics = compute_metrics(file_fp, df)
 
     st.subheader("✨ Calculated Metrics Preview")
     st.dataframe(df_with_metrics.head())
 
     # Add detailed DataFrame info for debugging
-    st.subheader("🔬 DataFrame Info (for Debugging)")
-    buffer = io.StringIO()
-    df_with_metrics.info(buf=buffer)
-    st.text(buffer.getvalue())
+    if debug:
+        st.subheader("🔬 DataFrame Info (for Debugging)")
+        buffer = io.StringIO()
+        df_with_metrics.info(buf=buffer)
+        st.text(buffer.getvalue())
 
     if df_with_metrics.empty:
         st.warning("The DataFrame is empty after calculations. No plots or recommendations can be generated.")
     else:
         # --- Plotting Section ---
+        # Every matplotlib plot is drawn on one shared, cached figure so the Agg canvas is set up
+        # and encoded to PNG once. Scatter plots of large uploads go to st.scatter_chart instead.
+        browser_scatter = len(df_with_metrics) > SCATTER_CHART_ROWS
+        # (kind, x, y, title, x label, y label) for each panel of the shared figure
+        panels = []
 
         # Plotting Boiler Efficiency vs Coal Flow
         has_boiler_eff_coal_flow = 'Boiler Efficiency' in df_with_metrics.columns and 'Coal Flow' in df_with_metrics.columns
-        st.write(f"Debug: 'Boiler Efficiency' and 'Coal Flow' columns exist: {has_boiler_eff_coal_flow}")
+        if debug:
+            st.write(f"Debug: 'Boiler Efficiency' and 'Coal Flow' columns exist: {has_boiler_eff_coal_flow}")
         if has_boiler_eff_coal_flow:
-            st.write("Debug: Attempting to plot Boiler Efficiency vs Coal Flow")
-            st.subheader("🔥 Boiler Efficiency vs Coal Flow")
-            try:
-                fig1, ax1 = plt.subplots(figsize=(10, 6))
-                sns.scatterplot(data=df_with_metrics, x="Coal Flow", y="Boiler Efficiency", ax=ax1)
-                ax1.set_title("Boiler Efficiency vs. Coal Flow")
-                ax1.set_xlabel("Coal Flow (kg/hr)")
-                ax1.set_ylabel("Boiler Efficiency (%)")
-                st.pyplot(fig1)
-                plt.close(fig1)
-            except Exception as e:
-                st.error(f"Error plotting Boiler Efficiency vs Coal Flow: {e}")
+            if debug:
+                st.write("Debug: Attempting to plot Boiler Efficiency vs Coal Flow")
+            if browser_scatter:
+                st.subheader("🔥 Boiler Efficiency vs Coal Flow")
+                # Only the two plotted columns are sent to the browser
+                st.scatter_chart(df_with_metrics[["Coal Flow", "Boiler Efficiency"]], x="Coal Flow", y="Boiler Efficiency",
+                                 x_label="Coal Flow (kg/hr)", y_label="Boiler Efficiency (%)")
+            else:
+                panels.append(("scatter", "Coal Flow", "Boiler Efficiency", "Boiler Efficiency vs. Coal Flow",
+                               "Coal Flow (kg/hr)", "Boiler Efficiency (%)"))
         else:
             st.warning("Cannot plot Boiler Efficiency vs Coal Flow: Required columns not found.")
 
         # Plotting CO2 Emissions vs Power Output
         has_co2_power_output = 'CO2 Emissions (kg/hr)' in df_with_metrics.columns and 'Power Output' in df_with_metrics.columns
-        st.write(f"Debug: 'CO2 Emissions (kg/hr)' and 'Power Output' columns exist: {has_co2_power_output}")
+        if debug:
+            st.write(f"Debug: 'CO2 Emissions (kg/hr)' and 'Power Output' columns exist: {has_co2_power_output}")
         if has_co2_power_output:
-            st.write("Debug: Attempting to plot CO2 Emissions vs Power Output")
-            st.subheader("🌫 CO₂ Emissions vs Power Output")
-            try:
-                fig2, ax2 = plt.subplots(figsize=(10, 6))
-                sns.scatterplot(data=df_with_metrics, x="Power Output", y="CO2 Emissions (kg/hr)", ax=ax2)
-                ax2.set_title("CO₂ Emissions vs. Power Output")
-                ax2.set_xlabel("Power Output (kWh)")
-                ax2.set_ylabel("CO₂ Emissions (kg/hr)")
-                st.pyplot(fig2)
-                plt.close(fig2)
-            except Exception as e:
-                st.error(f"Error plotting CO2 Emissions vs Power Output: {e}")
+            if debug:
+                st.write("Debug: Attempting to plot CO2 Emissions vs Power Output")
+            if browser_scatter:
+                st.subheader("🌫 CO₂ Emissions vs Power Output")
+                st.scatter_chart(df_with_metrics[["Power Output", "CO2 Emissions (kg/hr)"]], x="Power Output", y="CO2 Emissions (kg/hr)",
+                                 x_label="Power Output (kWh)", y_label="CO₂ Emissions (kg/hr)")
+            else:
+                panels.append(("scatter", "Power Output", "CO2 Emissions (kg/hr)", "CO₂ Emissions vs. Power Output",
+                               "Power Output (kWh)", "CO₂ Emissions (kg/hr)"))
         else:
             st.warning("Cannot plot CO₂ Emissions vs Power Output: Required columns not found.")
 
         # Plotting Plant Heat Rate Distribution
         has_plant_heat_rate = 'Plant Heat Rate (kcal/kWh)' in df_with_metrics.columns
-        st.write(f"Debug: 'Plant Heat Rate (kcal/kWh)' column exists: {has_plant_heat_rate}")
+        if debug:
+            st.write(f"Debug: 'Plant Heat Rate (kcal/kWh)' column exists: {has_plant_heat_rate}")
         if has_plant_heat_rate:
-            st.write("Debug: Attempting to plot Plant Heat Rate Distribution")
-            st.subheader("🔁 Plant Heat Rate Distribution")
-            try:
-                fig3, ax3 = plt.subplots(figsize=(10, 6))
-                sns.histplot(data=df_with_metrics, x="Plant Heat Rate (kcal/kWh)", kde=True, ax=ax3)
-                ax3.set_title("Distribution of Plant Heat Rate")
-                ax3.set_xlabel("Plant Heat Rate (kcal/kWh)")
-                ax3.set_ylabel("Frequency")
-                st.pyplot(fig3)
-                plt.close(fig3)
-            except Exception as e:
-                st.error(f"Error plotting Plant Heat Rate Distribution: {e}")
+            if debug:
+                st.write("Debug: Attempting to plot Plant Heat Rate Distribution")
+            panels.append(("hist", "Plant Heat Rate (kcal/kWh)", None, "Distribution of Plant Heat Rate",
+                           "Plant Heat Rate (kcal/kWh)", "Frequency"))
         else:
             st.warning("Cannot plot Plant Heat Rate Distribution: Required column not found.")
 
+        if panels:
+            st.subheader("📈 Performance Plots")
+            try:
+                # Reruns for the same upload and panels (e.g. ticking Debug) reuse the figure
+                # kept in this session without going through the cache at all
+                plots_key = (file_fp, tuple(panels))
+                if st.session_state.get("plots_key") != plots_key:
+                    st.session_state.plots_fig = make_plots_figure(file_fp, df_with_metrics, tuple(panels))
+                    st.session_state.plots_key = plots_key
+                st.pyplot(st.session_state.plots_fig)
+            except Exception as e:
+                st.error(f"Error plotting performance charts: {e}")
+
         # --- Recommendations Section ---
         st.subheader("💡 Performance Recommendations")
 
-        # Calculate average metrics for recommendations
-        avg_metrics = {
-            "Boiler Efficiency": df_with_metrics['Boiler Efficiency'].mean(),
-            "Plant Heat Rate (kcal/kWh)": df_with_metrics['Plant Heat Rate (kcal/kWh)'].mean(),
-            "Specific Fuel Consumption (kg/kWh)": df_with_metrics['Specific Fuel Consumption (kg/kWh)'].mean(),
-            "Flue Gas Loss": df_with_metrics['Flue Gas Loss'].mean(),
-            "CO2 Emissions (kg/hr)": df_with_metrics['CO2 Emissions (kg/hr)'].mean()
-        }
+        # Calculate average metrics for recommendations in one float64 reduction over the float32 metric columns
+        avg_metrics = df_with_metrics[list(METRIC_COLUMNS)].astype(np.float64).mean().to_dict()
 
-        recommendations_list = generate_recommendations(avg_metrics)
+        recommendations_list = generate_recommendations(avg_metrics, label="Avg: ")
 
         for rec in recommendations_list:
             st.markdown(rec) # Use markdown to render emojis and bold text
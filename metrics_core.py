@@ -0,0 +1,135 @@
+"""
+Single implementation of the plant metric formulas.
+
+The formulas live in _metrics_row. compute_metrics_array runs them over any number of
+operating points and returns float32 results; metrics_point handles exactly one and
+returns float64 values. utils.calculate_metrics_vec and utils.calculate_metrics_scalar
+are thin wrappers around those two.
+"""
+import os
+import threading
+
+import numpy as np
+
+# Cap Numba's worker pool; this must be set before numba is imported to take effect
+os.environ.setdefault("NUMBA_NUM_THREADS", str(min(8, os.cpu_count() or 1)))
+
+from numba import float32, float64, get_num_threads, njit, prange, set_num_threads, types, void
+from numba.types import UniTuple
+
+# Below this many rows the kernel runs on one thread; waking the worker pool
+# costs more than it saves on small uploads
+PARALLEL_MIN_ROWS = 10_000
+
+# metrics_kernel is nogil and Streamlit serves each session on its own thread; Numba's
+# default workqueue threading layer aborts the process when two threads enter a parallel
+# region at once, so kernel calls are serialized
+_kernel_lock = threading.Lock()
+
+
+# Read-only 1-D contiguous float64; pandas hands out read-only views of its columns and
+# writable arrays convert to this type too
+_ro_column = types.Array(float64, 1, "C", readonly=True)
+
+
+@njit(inline="always")
+def _metrics_row(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp):
+    """
+    Metrics for one operating point, inlined into metrics_kernel and metrics_point.
+
+    Returns (Boiler Efficiency, Plant Heat Rate, Specific Fuel Consumption, Flue Gas Loss,
+    CO2 Emissions). Zero denominators give 0.
+    """
+    energy_input = coal_flow * gcv
+    steam_energy = steam_flow * (steam_h - feed_h)
+    efficiency = (steam_energy / energy_input) * 100.0 if energy_input != 0 else 0.0
+    heat_rate = energy_input / power_output if power_output != 0 else 0.0
+    sfc = coal_flow / power_output if power_output != 0 else 0.0
+    # Flue gas loss as a percentage of heat input: flue gas specific heat of 0.24 kcal/kg°C
+    # (approximate) and a simplified flue gas mass flow of 1.5 kg per kg of coal
+    flue_loss = ((flue_temp - amb_temp) * 0.24 * 1.5 * coal_flow) / energy_input * 100.0 if energy_input != 0 else 0.0
+    # CO2 emissions factor for coal (approximate), kg CO2 per kg coal
+    co2 = coal_flow * 2.29
+    return efficiency, heat_rate, sfc, flue_loss, co2
+
+
+# Compiled eagerly for the signature compute_metrics_array uses (contiguous float64 inputs,
+# contiguous float32 output), so the first upload after a server start doesn't
+# wait on LLVM; cache=True then reuses the machine code across restarts.
+@njit(void(*[_ro_column] * 8, float32[:, ::1]), cache=True, fastmath=True, parallel=True, nogil=True)
+def metrics_kernel(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp, out):
+    """
+    Compiled single-pass version of the batch metric calculation.
+
+    Walks the eight input columns once and writes every metric for a row
+    before moving to the next, instead of building one temporary array per
+    intermediate result.
+
+    Parameters:
+    - coal_flow .. amb_temp: 1-D contiguous float64 arrays of equal length (input columns)
+    - out: preallocated (5, n) float32 output array; its rows receive Boiler Efficiency,
+      Plant Heat Rate, Specific Fuel Consumption, Flue Gas Loss and CO2 Emissions
+    """
+    for i in prange(coal_flow.shape[0]):
+        efficiency, heat_rate, sfc, flue_loss, co2 = _metrics_row(
+            coal_flow[i], gcv[i], steam_flow[i], steam_h[i], feed_h[i], power_output[i], flue_temp[i], amb_temp[i])
+        out[0, i] = efficiency
+        out[1, i] = heat_rate
+        out[2, i] = sfc
+        out[3, i] = flue_loss
+        out[4, i] = co2
+
+
+# Single operating points (the manual audit pages) skip the array setup and thread
+# handling of compute_metrics_array: one call into machine code with eight doubles.
+@njit(UniTuple(float64, 5)(*[float64] * 8), cache=True, fastmath=True, nogil=True)
+def metrics_point(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp):
+    """
+    Calculate every metric for one operating point.
+
+    Parameters are the eight inputs as floats, in the order of metrics_kernel's columns.
+
+    Returns:
+    Tuple of Boiler Efficiency, Plant Heat Rate, Specific Fuel Consumption, Flue Gas Loss
+    and CO2 Emissions.
+    """
+    return _metrics_row(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp)
+
+
+def run_metrics_kernel(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp, out):
+    """
+    Call metrics_kernel, using a single thread when there are fewer than PARALLEL_MIN_ROWS rows.
+    Only one call runs at a time across threads.
+
+    Parameters are the same as for metrics_kernel.
+    """
+    with _kernel_lock:
+        threads = get_num_threads()
+        if coal_flow.shape[0] < PARALLEL_MIN_ROWS:
+            set_num_threads(1)
+        try:
+            metrics_kernel(coal_flow, gcv, steam_flow, steam_h, feed_h, power_output, flue_temp, amb_temp, out)
+        finally:
+            set_num_threads(threads)
+
+
+def compute_metrics_array(X):
+    """
+    Calculate every metric for a batch of operating points.
+
+    Parameters:
+    - X: (8, n) array, or sequence of eight 1-D arrays, holding coal flow, GCV, steam flow,
+      steam enthalpy, feedwater enthalpy, power output, flue gas temperature and ambient
+      temperature
+
+    Returns:
+    (5, n) float32 array whose rows are Boiler Efficiency, Plant Heat Rate, Specific Fuel
+    Consumption, Flue Gas Loss and CO2 Emissions. The kernel computes in float64 and only
+    stores the results as float32.
+    """
+    # The kernel is compiled for contiguous float64 columns; this is a no-op for
+    # float64 DataFrame columns
+    columns = [np.ascontiguousarray(col, dtype=np.float64) for col in X]
+    out = np.empty((5, len(columns[0])), dtype=np.float32)
+    run_metrics_kernel(*columns, out)
+    return out
@@ -1,7 +1,97 @@
-def calculate_metrics(coal_flow, gcv, steam_flow, h_steam, h_feed,
-                      power_output, flue_temp, ambient_temp):
+import io
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from metrics_core import compute_metrics_array, metrics_point
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
+# Input columns of a plant data CSV, in calculate_metrics_scalar's argument order
+INPUT_COLUMNS = (
+    "Coal Flow",
+    "GCV",
+    "Steam Flow",
+    "Steam Enthalpy",
+    "Feedwater Enthalpy",
+    "Power Output",
+    "Flue Temp",
+    "Ambient Temp",
+)
+
+# Metric columns produced by calculate_metrics_scalar and calculate_metrics_vec, in order
+METRIC_COLUMNS = (
+    "Boiler Efficiency",
+    "Plant Heat Rate (kcal/kWh)",
+    "Specific Fuel Consumption (kg/kWh)",
+    "Flue Gas Loss",
+    "CO2 Emissions (kg/hr)",
+)
+
+
+class Metrics(NamedTuple):
+    """Metrics for one operating point, as returned by calculate_metrics_scalar."""
+    boiler_efficiency: float
+    plant_heat_rate: float
+    sfc: float
+    flue_gas_loss: float
+    co2: float
+
+    def as_dict(self):
+        """The metrics keyed by their METRIC_COLUMNS names, e.g. for generate_recommendations."""
+        return dict(zip(METRIC_COLUMNS, self))
+
+
+def read_plant_csv(file_bytes, numeric_columns, dtype="float64"):
+    """
+    Read an uploaded plant data CSV.
+
+    Parameters:
+    - file_bytes: Raw contents of the uploaded CSV file
+    - numeric_columns: Columns to parse as numbers (names missing from the file are ignored)
+    - dtype: Float dtype for the numeric columns; "float32" halves their memory
+
+    Returns:
+    DataFrame in which every numeric column present has the given dtype. Values that
+    are not numbers become NaN.
+    """
+    dtypes = {col: dtype for col in numeric_columns}
+    try:
+        # pyarrow parses in parallel and skips type inference for the known columns
+        return pd.read_csv(io.BytesIO(file_bytes), engine="pyarrow", dtype=dtypes)
+    except (ImportError, ValueError):
+        # pyarrow missing, or stray text in a numeric column: use the C engine and coerce
+        df = pd.read_csv(io.BytesIO(file_bytes))
+        for col in numeric_columns:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+        return df
+
+
+def to_csv_bytes(df):
+    """
+    Serialize a DataFrame to CSV bytes for st.download_button.
+
+    Uses pyarrow's CSV writer, which streams the table out in C++ without
+    building the whole file as a Python string first. Falls back to
+    DataFrame.to_csv when pyarrow is not installed.
+    """
+    if pa is None:
+        return df.to_csv(index=False).encode("utf-8")
+    buffer = io.BytesIO()
+    pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buffer)
+    return buffer.getvalue()
+
+
+def calculate_metrics_scalar(coal_flow, gcv, steam_flow, h_steam, h_feed,
+                             power_output, flue_temp, ambient_temp):
     """
-    Calculate boiler and plant performance metrics.
+    Calculate boiler and plant performance metrics for a single operating point.
 
     Parameters:
     - coal_flow: Coal consumption rate (kg/hr)
@@ -13,76 +103,131 @@ def calculate_metrics(coal_flow, gcv, steam_flow, h_steam, h_feed,
     - flue_temp: Flue gas temperature (°C)
     - ambient_temp: Ambient temperature (°C)
 
+    None or NaN inputs are treated as 0.
+
     Returns:
-    Dictionary of metrics:
-    - Boiler Efficiency (%)
-    - Heat Rate (kcal/kWh)
-    - Specific Fuel Consumption (kg/kWh)
-    - Flue Gas Loss (%)
-    - CO2 Emissions (kg/hr)
+    Metrics tuple:
+    - boiler_efficiency: Boiler Efficiency (%)
+    - plant_heat_rate: Plant Heat Rate (kcal/kWh)
+    - sfc: Specific Fuel Consumption (kg/kWh)
+    - flue_gas_loss: Flue Gas Loss (%)
+    - co2: CO2 Emissions (kg/hr)
     """
+    values = [coal_flow, gcv, steam_flow, h_steam, h_feed, power_output, flue_temp, ambient_temp]
+    # x != x is only true for NaN
+    values = [0.0 if v is None or (isinstance(v, float) and v != v) else float(v) for v in values]
 
-    heat_input = coal_flow * gcv
-    steam_energy = steam_flow * (h_steam - h_feed)
+    return Metrics(*metrics_point(*values))
 
-    boiler_efficiency = (steam_energy / heat_input) * 100 if heat_input else 0
-    heat_rate = heat_input / power_output if power_output else 0
-    sfc = coal_flow / power_output if power_output else 0
 
-    # Constants for flue gas loss calculation
-    cp_flue_gas = 0.24  # kcal/kg°C (approximate specific heat capacity of flue gas)
-    flue_gas_flow = 1.5 * coal_flow  # Simplified estimation of flue gas mass flow (kg/hr)
-    flue_gas_loss = ((flue_temp - ambient_temp) * cp_flue_gas * flue_gas_flow) / heat_input * 100 if heat_input else 0
+def calculate_metrics_vec(cols):
+    """
+    Vectorized calculate_metrics_scalar over every row of a batch.
 
-    # CO2 emissions factor for coal (approximate)
-    co2_emissions = coal_flow * 2.32  # kg CO2 per kg coal
+    Parameters:
+    - cols: DataFrame or dictionary of column name -> NumPy array with numeric "Coal Flow", "GCV",
+      "Steam Flow", "Steam Enthalpy", "Feedwater Enthalpy", "Power Output", "Flue Temp" and
+      "Ambient Temp" columns
 
-    return {
-        "Boiler Efficiency (%)": round(boiler_efficiency, 2),
-        "Heat Rate (kcal/kWh)": round(heat_rate, 2),
-        "Specific Fuel Consumption (kg/kWh)": round(sfc, 4),
-        "Flue Gas Loss (%)": round(flue_gas_loss, 2),
-        "CO2 Emissions (kg/hr)": round(co2_emissions, 2)
-    }
+    Returns:
+    Dictionary of metric name -> float32 NumPy array, in the row order of cols.
+    """
+    # All five metrics are written into one preallocated float32 block in a single compiled
+    # pass over the rows. Each metric is a contiguous row of the block, so the returned
+    # arrays are views into one allocation. float32 storage is ample for the displayed
+    # precision and halves the memory the plots and export read.
+    out = compute_metrics_array([cols[col] for col in INPUT_COLUMNS])
+    return dict(zip(METRIC_COLUMNS, out))
 
 
-def generate_recommendations(metrics):
-    rec = []
+def _above(x):
+    """Smallest float greater than x, used to make a threshold inclusive."""
+    return np.nextafter(x, np.inf)
+
+
+# Placeholder for the label and value in the message templates below
+_VALUE_FIELD = "{label}{value:.2f}"
+
+
+def _split_templates(*templates):
+    """Split each message template around _VALUE_FIELD into a (head, tail) pair."""
+    return tuple(tuple(template.split(_VALUE_FIELD)) for template in templates)
+
 
-    be = metrics.get("Boiler Efficiency (%)", 0)
-    if be > 85:
-        rec.append("✅ Excellent boiler efficiency.")
-    elif be >= 70:
-        rec.append("⚠️ Moderate efficiency. Optimize air/fuel ratio.")
-    else:
-        rec.append("❌ Low efficiency. Improve combustion or insulation.")
-
-    hr = metrics.get("Heat Rate (kcal/kWh)", 0)
-    if hr > 3000:
-        rec.append("❌ High heat rate. Check turbines & steam conditions.")
-    elif hr > 2500:
-        rec.append("⚠️ Slightly high heat rate. Review operations.")
-    else:
-        rec.append("✅ Efficient heat rate.")
-
-    sfc = metrics.get("Specific Fuel Consumption (kg/kWh)", 0)
-    if sfc > 0.75:
-        rec.append("❌ High fuel usage. Check fuel quality.")
-    elif sfc > 0.6:
-        rec.append("⚠️ Improve combustion.")
-    else:
-        rec.append("✅ Efficient fuel use.")
-
-    fl = metrics.get("Flue Gas Loss (%)", 0)
-    if fl > 10:
-        rec.append("❌ High flue gas loss. Add economizers.")
-    elif fl > 5:
-        rec.append("⚠️ Consider better insulation.")
-    else:
-        rec.append("✅ Heat recovery is good.")
-
-    co2 = metrics.get("CO2 Emissions (kg/hr)", 0)
-    if co2 > 8000:
-        rec.append("⚠️ High CO₂ emissions. Explore cleaner fuels or carbon capture.")
-
-    return "\n\n".join(rec)
+# Recommendation message templates, built once at import time. Each tuple runs from the
+# worst to the best rating. The templates are stored split around the value, so
+# generate_recommendations only formats the number instead of parsing the whole message.
+_TPL_BE = _split_templates(
+    "❌ **Boiler Efficiency ({label}{value:.2f}%)**: Inefficient. Check for incomplete combustion, poor coal quality, leaks, and fouling in boiler tubes. Consider retrofitting economizers or better insulation.",
+    "⚠️ **Boiler Efficiency ({label}{value:.2f}%)**: Good, but room for improvement. Optimize excess air supply, clean heat transfer surfaces (e.g., soot blowing).",
+    "✅ **Boiler Efficiency ({label}{value:.2f}%)**: Excellent. Maintain current operation and schedule routine maintenance.",
+)
+_TPL_PHR = _split_templates(
+    "❌ **Plant Heat Rate ({label}{value:.2f} kcal/kWh)**: Inefficient. Audit heat exchangers, check turbine performance, condenser vacuum issues, and unaccounted auxiliary consumption.",
+    "⚠️ **Plant Heat Rate ({label}{value:.2f} kcal/kWh)**: Average. Inspect turbine sealing, condenser vacuum, and reheater losses.",
+    "✅ **Plant Heat Rate ({label}{value:.2f} kcal/kWh)**: Efficient. Maintain load management and keep equipment in tuned condition.",
+)
+_TPL_SFC = _split_templates(
+    "❌ **Specific Fuel Consumption ({label}{value:.2f} kg/kWh)**: High. Recommend coal quality improvement, combustion tuning, and reducing clinker formation.",
+    "⚠️ **Specific Fuel Consumption ({label}{value:.2f} kg/kWh)**: Acceptable. Verify air-fuel ratio, minimize unburnt carbon.",
+    "✅ **Specific Fuel Consumption ({label}{value:.2f} kg/kWh)**: Efficient. Ensure consistent coal quality and maintain feed systems.",
+)
+_TPL_FGL = _split_templates(
+    "❌ **Flue Gas Loss ({label}{value:.2f}%)**: High heat loss. Suggest urgent flue gas heat recovery installation, reduce excess air, and check for insulation leaks.",
+    "⚠️ **Flue Gas Loss ({label}{value:.2f}%)**: Moderate loss. Consider preheating combustion air or recovering heat using economizer.",
+    "✅ **Flue Gas Loss ({label}{value:.2f}%)**: Optimal flue gas recovery. Keep stack temperature and air ratio monitored.",
+)
+_TPL_CO2 = _split_templates(
+    "⚠️ **CO₂ Emissions ({label}{value:.2f} kg/hr)**: High CO₂ emissions. Explore cleaner fuels or carbon capture technologies.",
+    "✅ **CO₂ Emissions ({label}{value:.2f} kg/hr)**: Monitor CO₂ emissions regularly and explore opportunities for reduction.",
+)
+
+_BAD, _FAIR, _GOOD = 0, 1, 2
+
+# Recommendation thresholds per metric: (bin edges, message for each bin).
+# np.searchsorted(edges, value, side="right") gives the bin index, where bin i holds
+# edges[i-1] <= value < edges[i]; _above() turns an inclusive "value <= x" bound into an edge.
+# The lowest edge of the heat rate, fuel consumption, flue gas and CO2 tables sits just above 0
+# so that zero values (e.g. from a zero power output) are not reported as efficient.
+THRESHOLDS = {
+    "Boiler Efficiency": (np.array([70.0, _above(85.0)]), (
+        _TPL_BE[_BAD], _TPL_BE[_FAIR], _TPL_BE[_GOOD],
+    )),
+    "Plant Heat Rate (kcal/kWh)": (np.array([_above(0.0), 2500.0, _above(3000.0)]), (
+        _TPL_PHR[_BAD], _TPL_PHR[_GOOD], _TPL_PHR[_FAIR], _TPL_PHR[_BAD],
+    )),
+    "Specific Fuel Consumption (kg/kWh)": (np.array([_above(0.0), 0.6, _above(0.75)]), (
+        _TPL_SFC[_BAD], _TPL_SFC[_GOOD], _TPL_SFC[_FAIR], _TPL_SFC[_BAD],
+    )),
+    "Flue Gas Loss": (np.array([_above(0.0), 5.0, _above(10.0)]), (
+        _TPL_FGL[_BAD], _TPL_FGL[_GOOD], _TPL_FGL[_FAIR], _TPL_FGL[_BAD],
+    )),
+    # No recommendation when there are no emissions
+    "CO2 Emissions (kg/hr)": (np.array([_above(0.0), _above(8000.0)]), (
+        None, _TPL_CO2[1], _TPL_CO2[0],
+    )),
+}
+
+
+def generate_recommendations(metrics, label=""):
+    """
+    Build recommendation messages from calculated metrics.
+
+    Parameters:
+    - metrics: Dictionary of metric name -> value, e.g. Metrics.as_dict() or batch averages
+    - label: Text shown before each value, e.g. "Avg: " for batch averages
+
+    Returns:
+    List of markdown recommendation strings.
+    """
+    rec = []
+    for key, (edges, messages) in THRESHOLDS.items():
+        value = metrics.get(key, 0)
+        # NaN (e.g. an average over a column with an inf cell) sorts past every edge; the
+        # old if/elif ladders fell through to their else branch, which is always bin 0
+        index = 0 if value != value else int(np.searchsorted(edges, value, side="right"))
+        message = messages[index]
+        if message is not None:
+            head, tail = message
+            rec.append(f"{head}{label}{value:.2f}{tail}")
+    return rec